@@ -1,7 +1,7 @@
 import asyncio
 import uuid
 from fastapi import APIRouter, BackgroundTasks, HTTPException
-from app.api.routes import TextSummaryRequest
+from app.api.routes import TextSummaryRequest, get_lengths
 from app.services.summariser import SummariserService
 
 router = APIRouter()
@@ -17,7 +17,9 @@ async def process_summarization(task_id, request):
             max_length=request.max_length,
             min_length=request.min_length,
             do_sample=request.do_sample,
-            temperature=request.temperature
+            temperature=request.temperature,
+            use_assisted_generation=request.use_assisted_generation,
+            lengths=get_lengths(request)
         )
 
         task_results[task_id] = {
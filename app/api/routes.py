@@ -1,15 +1,24 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Query
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field, HttpUrl
-from typing import Optional, Union
+from typing import Optional, Union, List
 from app.services.summariser import SummariserService
 from app.services.url_extractor import URLExtractorService
 from app.services.cache import hash_text, get_cached_summary, cache_summary
+from app.services.load_shedder import LoadShedder, RequestRejected, PRIORITY_CLASSES
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api")
 summariser_service = SummariserService()
+# Load the draft model at startup so the first degraded or assisted request doesn't wait on it
+summariser_service.preload_assistant_model()
+load_shedder = LoadShedder()
+
+class SummaryLength(BaseModel):
+    max_length: int = Field(..., ge=30, le=500, description="Maximum length of the summary")
+    min_length: int = Field(..., ge=10, le=200, description="Minimum length of the summary")
 
 class TextSummaryRequest(BaseModel):
     text: str = Field(..., min_length=10, description="The text to summarise")
@@ -17,6 +26,8 @@ class TextSummaryRequest(BaseModel):
     min_length: Optional[int] = Field(50, ge=10, le=200, description="Minimum length of the summary")
     do_sample: Optional[bool] = Field(False, description="Whether to use sampling for generation")
     temperature: Optional[float] = Field(1.0, ge=0.7, le=2.0, description="Sampling temperature")
+    use_assisted_generation: Optional[bool] = Field(None, description="Use a draft model to speed up greedy decoding (defaults to the server setting)")
+    lengths: Optional[List[SummaryLength]] = Field(None, min_items=1, max_items=4, description="Several summary lengths to generate in one call, overriding max_length and min_length")
 
 class URLSummaryRequest(BaseModel):
     url: HttpUrl = Field(..., description="The URL to extract content from and summarise")
@@ -24,6 +35,8 @@ class URLSummaryRequest(BaseModel):
     min_length: Optional[int] = Field(50, ge=10, le=200, description="Minimum length of the summary")
     do_sample: Optional[bool] = Field(False, description="Whether to use sampling for generation")
     temperature: Optional[float] = Field(1.0, ge=0.7, le=2.0, description="Sampling temperature")
+    use_assisted_generation: Optional[bool] = Field(None, description="Use a draft model to speed up greedy decoding (defaults to the server setting)")
+    lengths: Optional[List[SummaryLength]] = Field(None, min_items=1, max_items=4, description="Several summary lengths to generate in one call, overriding max_length and min_length")
 
 class SummaryResponse(BaseModel):
     original_text_length: int
@@ -31,31 +44,58 @@ class SummaryResponse(BaseModel):
     summary_length: int
     source_type: str = "text"  # "text" or "url"
     source_url: Optional[str] = None
+    summaries: Optional[List[dict]] = None
     metadata: Optional[dict] = None
 
+def get_lengths(request):
+    """Return the requested (max_length, min_length) pairs, if several lengths were asked for"""
+    if not request.lengths:
+        return None
+    return [(length.max_length, length.min_length) for length in request.lengths]
+
+async def run_summarisation(http_request, **summarise_kwargs):
+    """Summarise once admitted by the load shedder, off the event loop so queued requests can be prioritised"""
+    async with load_shedder.admit(http_request) as admission:
+        result = await run_in_threadpool(
+            summariser_service.summarise,
+            degrade=admission["degrade"],
+            **summarise_kwargs
+        )
+
+    result["metadata"]["priority"] = admission["priority"]
+    result["metadata"]["queue_seconds"] = admission["queue_seconds"]
+    return result
+
 @router.post("/summarise", response_model=SummaryResponse)
-async def summarise_text(request: TextSummaryRequest):
+async def summarise_text(request: TextSummaryRequest, http_request: Request):
     try:
-        # Check cache first
+        lengths = get_lengths(request)
+
+        # Check cache first (multi-length responses are not cached by length)
         text_hash = hash_text(request.text)
-        cached_summary = get_cached_summary(
-            text_hash,
-            request.max_length,
-            request.min_length,
-            request.do_sample,
-            request.temperature
-        )
+        cached_summary = None
+        if lengths is None:
+            cached_summary = get_cached_summary(
+                text_hash,
+                request.max_length,
+                request.min_length,
+                request.do_sample,
+                request.temperature
+            )
 
         if cached_summary:
             return cached_summary
 
         # If not in cache, generate summary
-        result = summariser_service.summarise(
+        result = await run_summarisation(
+            http_request,
             text=request.text,
             max_length=request.max_length,
             min_length=request.min_length,
             do_sample=request.do_sample,
-            temperature=request.temperature
+            temperature=request.temperature,
+            use_assisted_generation=request.use_assisted_generation,
+            lengths=lengths
         )
 
         # Format the response according to the SummaryResponse model
@@ -64,25 +104,29 @@ async def summarise_text(request: TextSummaryRequest):
             "summary": result["summary"],
             "summary_length": len(result["summary"]),
             "source_type": "text",
+            "summaries": result.get("summaries"),
             "metadata": result.get("metadata", {})
         }
 
-        # Cache the result
-        cache_summary(
-            text_hash,
-            request.max_length,
-            request.min_length,
-            request.do_sample,
-            request.temperature,
-            response
-        )
+        # Cache the result, unless it was degraded under load
+        if lengths is None and not response["metadata"].get("degraded"):
+            cache_summary(
+                text_hash,
+                request.max_length,
+                request.min_length,
+                request.do_sample,
+                request.temperature,
+                response
+            )
 
         return response
+    except RequestRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/summarise-url", response_model=SummaryResponse)
-async def summarise_url(request: URLSummaryRequest):
+async def summarise_url(request: URLSummaryRequest, http_request: Request):
     try:
         # Extract content from URL
         logger.info(f"Extracting content from URL: {request.url}")
@@ -96,12 +140,15 @@ async def summarise_url(request: URLSummaryRequest):
         logger.info(f"Extracted {len(content)} characters from {request.url}")
 
         # Summarise the extracted content
-        result = summariser_service.summarise(
+        result = await run_summarisation(
+            http_request,
             text=content,
             max_length=request.max_length,
             min_length=request.min_length,
             do_sample=request.do_sample,
-            temperature=request.temperature
+            temperature=request.temperature,
+            use_assisted_generation=request.use_assisted_generation,
+            lengths=get_lengths(request)
         )
 
         # Create a more structured response
@@ -111,10 +158,13 @@ async def summarise_url(request: URLSummaryRequest):
             "summary_length": len(result["summary"]),
             "source_type": "url",
             "source_url": str(request.url),
+            "summaries": result.get("summaries"),
             "metadata": result.get("metadata", {})
         }
     except HTTPException:
         raise
+    except RequestRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         logger.error(f"Error processing URL {request.url}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -123,3 +173,39 @@ async def summarise_url(request: URLSummaryRequest):
 async def get_status():
     """Get the current status of the summariser service"""
     return summariser_service.get_status()
+
+@router.get("/metrics")
+async def get_metrics():
+    """Get load shedding and degradation counters"""
+    return load_shedder.get_metrics()
+
+@router.get("/capacity")
+async def get_capacity(
+    input_tokens: int = Query(512, ge=1, le=1024, description="Input length of a prospective request in tokens"),
+    max_length: int = Query(150, ge=30, le=500, description="Maximum summary length of a prospective request"),
+    priority: str = Query("interactive", description="Priority class of a prospective request"),
+    do_sample: bool = Query(False, description="Whether a prospective request uses sampling"),
+    use_assisted_generation: Optional[bool] = Query(None, description="Whether a prospective request asks for assisted generation")
+):
+    """Get queue, throughput and latency statistics for autoscaling, with a predicted wait"""
+    if priority not in PRIORITY_CLASSES:
+        raise HTTPException(status_code=422, detail=f"Unknown priority class: {priority}")
+
+    gate = load_shedder.gate
+    requests_ahead = load_shedder.requests_ahead(priority)
+    # Per-token decode cost differs several-fold between strategies
+    strategy = summariser_service.predict_decoding_strategy(do_sample, use_assisted_generation)
+
+    return {
+        "queue_depth": {name: gate.queue_depth(name) for name in PRIORITY_CLASSES},
+        "in_flight": gate.active,
+        "concurrency_slots": gate.slots,
+        **summariser_service.capacity.get_stats(),
+        "predicted_wait": {
+            "input_tokens": input_tokens,
+            "max_length": max_length,
+            "priority": priority,
+            "requests_ahead": requests_ahead,
+            **summariser_service.capacity.predict_wait(input_tokens, max_length, requests_ahead, gate.slots, strategy)
+        }
+    }
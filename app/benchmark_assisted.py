@@ -0,0 +1,58 @@
+# Simple script to benchmark assisted generation against standard greedy decoding on CPU
+import time
+
+try:
+    from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+
+    model_name = "facebook/bart-large-cnn"
+    assistant_name = "sshleifer/distilbart-cnn-6-6"
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+    assistant_model = AutoModelForSeq2SeqLM.from_pretrained(assistant_name)
+    print("Models loaded successfully!")
+
+    text = (
+        "The city council approved a new plan on Tuesday to expand the public transport network, "
+        "adding three bus routes and extending the tram line to the northern suburbs. Officials said "
+        "the expansion would cut average commute times by around fifteen minutes and reduce traffic "
+        "congestion in the city centre. Construction is expected to begin next spring and be completed "
+        "within two years. Local businesses welcomed the decision, although some residents raised "
+        "concerns about noise during the building works and the cost of the project to taxpayers."
+    )
+    inputs = tokenizer(text, return_tensors="pt", max_length=1024, truncation=True)
+    generation_kwargs = dict(max_length=150, min_length=50, do_sample=False, num_beams=1, no_repeat_ngram_size=3)
+
+    # Warm up both paths so the timings exclude one-off initialisation
+    model.generate(inputs["input_ids"], **generation_kwargs)
+    model.generate(inputs["input_ids"], assistant_model=assistant_model, **generation_kwargs)
+
+    runs = 3
+
+    start = time.time()
+    for _ in range(runs):
+        standard_ids = model.generate(inputs["input_ids"], **generation_kwargs)
+    standard_time = (time.time() - start) / runs
+
+    start = time.time()
+    for _ in range(runs):
+        assisted_ids = model.generate(inputs["input_ids"], assistant_model=assistant_model, **generation_kwargs)
+    assisted_time = (time.time() - start) / runs
+
+    standard_summary = tokenizer.decode(standard_ids[0], skip_special_tokens=True)
+    assisted_summary = tokenizer.decode(assisted_ids[0], skip_special_tokens=True)
+
+    print(f"Standard greedy: {standard_time:.2f}s per summary")
+    print(f"Assisted greedy: {assisted_time:.2f}s per summary")
+    print(f"Speedup: {standard_time / assisted_time:.2f}x")
+    print(f"Identical outputs: {standard_ids.tolist() == assisted_ids.tolist()}")
+    print(f"Summary: {assisted_summary}")
+
+    if standard_summary != assisted_summary:
+        print(f"Standard summary differs: {standard_summary}")
+
+except ImportError as e:
+    print(f"Error importing transformers: {e}")
+    print("Please try reinstalling with: pip install transformers torch")
+except Exception as e:
+    print(f"Error during benchmarking: {e}")
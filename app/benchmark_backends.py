@@ -0,0 +1,53 @@
+# Simple script to compare the torch and ONNX Runtime inference backends on CPU
+import os
+import time
+
+try:
+    from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+    from app.services.inference_backend import TorchBackend, OnnxRuntimeBackend
+
+    model_name = "facebook/bart-large-cnn"
+    # Same location as SummariserService, so an existing ONNX export is reused
+    cache_dir = os.environ.get("TRANSFORMERS_CACHE", "/tmp/huggingface_cache")
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=cache_dir)
+    backends = [
+        TorchBackend(AutoModelForSeq2SeqLM.from_pretrained(model_name, cache_dir=cache_dir), "cpu"),
+        OnnxRuntimeBackend(model_name, cache_dir),
+    ]
+    print("Backends loaded successfully!")
+
+    text = (
+        "The city council approved a new plan on Tuesday to expand the public transport network, "
+        "adding three bus routes and extending the tram line to the northern suburbs. Officials said "
+        "the expansion would cut average commute times by around fifteen minutes and reduce traffic "
+        "congestion in the city centre. Construction is expected to begin next spring and be completed "
+        "within two years. Local businesses welcomed the decision, although some residents raised "
+        "concerns about noise during the building works and the cost of the project to taxpayers."
+    )
+    inputs = tokenizer(text, return_tensors="pt", max_length=1024, truncation=True)
+    generation_kwargs = dict(max_length=150, min_length=50, do_sample=False, num_beams=1, no_repeat_ngram_size=3)
+
+    runs = 3
+    summaries = {}
+    for backend in backends:
+        # Warm up so the timings exclude one-off initialisation
+        backend.generate(inputs["input_ids"], **generation_kwargs)
+
+        start = time.time()
+        for _ in range(runs):
+            summary_ids = backend.generate(inputs["input_ids"], **generation_kwargs)
+        elapsed = (time.time() - start) / runs
+
+        summaries[backend.name] = tokenizer.decode(summary_ids[0], skip_special_tokens=True)
+        print(f"{backend.name}: {elapsed:.2f}s per summary")
+
+    print(f"Equivalent outputs: {len(set(summaries.values())) == 1}")
+    for name, summary in summaries.items():
+        print(f"{name} summary: {summary}")
+
+except ImportError as e:
+    print(f"Error importing dependencies: {e}")
+    print("Please try reinstalling with: pip install transformers torch optimum[onnxruntime]")
+except Exception as e:
+    print(f"Error during benchmarking: {e}")
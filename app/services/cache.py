@@ -1,4 +1,6 @@
 import hashlib
+import threading
+from collections import OrderedDict
 from functools import lru_cache
 
 @lru_cache(maxsize=100)
@@ -14,3 +16,30 @@ def cache_summary(text_hash, max_length, min_length, do_sample, temperature, sum
 
 def hash_text(text):
     return hashlib.md5(text.encode()).hexdigest()
+
+def hash_tokens(token_ids):
+    return hashlib.md5(",".join(str(token_id) for token_id in token_ids).encode()).hexdigest()
+
+class EncoderCache:
+    """Bounded in-memory LRU cache of encoder outputs, shared across request threads"""
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import deque
+
+# Priors used until real measurements arrive (roughly BART-large-CNN on CPU)
+DEFAULT_ENCODE_SECONDS_PER_TOKEN = 0.002
+DEFAULT_DECODE_SECONDS_PER_TOKEN = {
+    "beam_search": 0.05,
+    "sampling": 0.05,
+    "greedy": 0.015,
+    "assisted_greedy": 0.01
+}
+
+class CapacityTracker:
+    """Continuously updated latency and throughput statistics for capacity estimation"""
+
+    def __init__(self, window_seconds=60, smoothing=0.2, decode_includes_encode=False):
+        self.window_seconds = window_seconds
+        # Weight of the newest sample in the exponential moving averages
+        self.smoothing = smoothing
+        # Backends that cannot run the encoder separately time it as part of generation
+        self.decode_includes_encode = decode_includes_encode
+
+        self.encode_seconds_per_token = None
+        # Per decoding strategy, whose per-token costs differ several-fold
+        self.decode_seconds_per_token = {}
+        self.request_seconds = None
+        self.completed_requests = 0
+
+        # (finished_at, generated_tokens, started_at) for the rolling throughput window
+        self.generated = deque()
+        self.lock = threading.Lock()
+
+    def update_average(self, current, sample):
+        if current is None:
+            return sample
+        return current + self.smoothing * (sample - current)
+
+    def record_encode(self, input_tokens, seconds):
+        """Record an encoder pass over input_tokens tokens"""
+        if input_tokens <= 0:
+            return
+        with self.lock:
+            self.encode_seconds_per_token = self.update_average(self.encode_seconds_per_token, seconds / input_tokens)
+
+    def record_tokens(self, output_tokens, seconds):
+        """Count tokens generated over the last seconds towards the rolling throughput, whichever model produced them"""
+        if output_tokens <= 0:
+            return
+        now = time.time()
+        with self.lock:
+            self.generated.append((now, output_tokens, now - seconds))
+            self.prune(now)
+
+    def record_decode(self, output_tokens, seconds, strategy):
+        """Record the latency of a main model generate call that produced output_tokens tokens"""
+        if output_tokens <= 0:
+            return
+        with self.lock:
+            self.decode_seconds_per_token[strategy] = self.update_average(
+                self.decode_seconds_per_token.get(strategy), seconds / output_tokens
+            )
+
+    def record_request(self, seconds):
+        """Record the total service time of a completed summarisation request"""
+        with self.lock:
+            self.request_seconds = self.update_average(self.request_seconds, seconds)
+            self.completed_requests += 1
+
+    def prune(self, now):
+        while self.generated and self.generated[0][0] < now - self.window_seconds:
+            self.generated.popleft()
+
+    def tokens_per_second(self):
+        """Generated tokens per second over the rolling window"""
+        now = time.time()
+        with self.lock:
+            self.prune(now)
+            if not self.generated:
+                return 0.0
+
+            # Divide by the time covered so far, not the full window, so throughput after
+            # startup or an idle spell is not under-reported
+            first_started_at = min(started_at for _, _, started_at in self.generated)
+            elapsed = min(self.window_seconds, now - first_started_at)
+            return sum(tokens for _, tokens, _ in self.generated) / max(elapsed, 1e-3)
+
+    def estimate_service_seconds(self, input_tokens, output_tokens, strategy="beam_search"):
+        """Predict how long the model needs to summarise a request of the given size and decoding strategy"""
+        measured_rate = self.decode_seconds_per_token.get(strategy)
+        decode_rate = measured_rate or DEFAULT_DECODE_SECONDS_PER_TOKEN.get(strategy, DEFAULT_DECODE_SECONDS_PER_TOKEN["beam_search"])
+        # Measured decode timings already include the encoder, so adding it would count it twice
+        if self.decode_includes_encode and measured_rate is not None:
+            return output_tokens * decode_rate
+
+        encode_rate = self.encode_seconds_per_token or DEFAULT_ENCODE_SECONDS_PER_TOKEN
+        return input_tokens * encode_rate + output_tokens * decode_rate
+
+    def predict_wait(self, input_tokens, output_tokens, requests_ahead, slots=1, strategy="beam_search"):
+        """
+        Predict the time until a new request of the given size completes.
+
+        Args:
+            input_tokens (int): Input length of the new request in tokens
+            output_tokens (int): Expected summary length in tokens (its max_length)
+            requests_ahead (int): Requests queued or running ahead of it
+            slots (int): Requests the model serves concurrently
+            strategy (str): Decoding strategy the new request would use
+
+        Returns:
+            dict: Predicted queue wait, service time and total, in seconds
+        """
+        service_seconds = self.estimate_service_seconds(input_tokens, output_tokens, strategy)
+        # Without history, assume requests ahead are the same size as this one
+        per_request = self.request_seconds or service_seconds
+        queue_seconds = requests_ahead * per_request / max(1, slots)
+
+        return {
+            "decoding_strategy": strategy,
+            "queue_seconds": round(queue_seconds, 2),
+            "service_seconds": round(service_seconds, 2),
+            "total_seconds": round(queue_seconds + service_seconds, 2)
+        }
+
+    def get_stats(self):
+        """Return the current moving averages and rolling throughput"""
+        tokens_per_second = self.tokens_per_second()
+        with self.lock:
+            return {
+                "tokens_per_second": round(tokens_per_second, 2),
+                "throughput_window_seconds": self.window_seconds,
+                "decode_seconds_per_token": dict(self.decode_seconds_per_token),
+                "encode_seconds_per_token": self.encode_seconds_per_token,
+                "decode_includes_encode": self.decode_includes_encode,
+                "average_request_seconds": self.request_seconds,
+                "completed_requests": self.completed_requests,
+                # False while estimates still rely on the priors
+                "warm": bool(self.decode_seconds_per_token)
+            }
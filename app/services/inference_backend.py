@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import logging
+from abc import ABC, abstractmethod
+import torch
+
+logger = logging.getLogger(__name__)
+
+class InferenceBackend(ABC):
+    """Runs seq2seq generation for the summariser; subclasses wrap a specific runtime"""
+
+    name = "base"
+    device = "cpu"
+    # Assisted generation needs a PyTorch model to hand the draft model to
+    supports_assisted_generation = False
+    # Whether encode() is implemented and generate() accepts precomputed encoder_outputs
+    supports_encoder_reuse = False
+
+    def encode(self, input_ids):
+        """Run only the encoder and return its last hidden state (only when supports_encoder_reuse)"""
+        raise NotImplementedError(f"{self.name} backend does not support encoder reuse")
+
+    @abstractmethod
+    def generate(self, input_ids, **generation_kwargs):
+        """
+        Generate output token IDs for the given input IDs.
+
+        Args:
+            input_ids: Tokenised input of shape (1, sequence_length)
+            **generation_kwargs: Hugging Face generation parameters
+
+        Returns:
+            The generated token IDs, one row per input
+        """
+
+class TorchBackend(InferenceBackend):
+    """PyTorch eager execution of a loaded transformers model"""
+
+    name = "torch"
+    supports_assisted_generation = True
+    supports_encoder_reuse = True
+
+    def __init__(self, model, device):
+        self.model = model
+        self.device = device
+
+    def encode(self, input_ids):
+        with torch.no_grad():
+            return self.model.get_encoder()(input_ids=input_ids).last_hidden_state
+
+    def generate(self, input_ids, **generation_kwargs):
+        return self.model.generate(input_ids, **generation_kwargs)
+
+class OnnxRuntimeBackend(InferenceBackend):
+    """ONNX Runtime CPU execution of the exported encoder and decoder (with KV cache)"""
+
+    name = "onnxruntime"
+
+    def __init__(self, model_name, cache_dir):
+        # Optional dependency: pip install optimum[onnxruntime]
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+        # Exporting takes minutes, so the ONNX graphs are saved next to the model cache
+        export_dir = os.path.join(cache_dir, "onnx", model_name.replace("/", "--"))
+
+        if os.path.isdir(export_dir):
+            logger.info(f"Loading exported ONNX model from {export_dir}")
+            self.model = ORTModelForSeq2SeqLM.from_pretrained(
+                export_dir,
+                use_cache=True,
+                provider="CPUExecutionProvider"
+            )
+        else:
+            logger.info(f"Exporting {model_name} to ONNX in {export_dir}")
+            self.model = ORTModelForSeq2SeqLM.from_pretrained(
+                model_name,
+                export=True,
+                use_cache=True,
+                cache_dir=cache_dir,
+                provider="CPUExecutionProvider"
+            )
+            self.save_export(export_dir)
+
+    def save_export(self, export_dir):
+        # Save into a temporary directory and rename it into place, so an interrupted
+        # export never leaves a half-written directory that later starts would load
+        parent_dir = os.path.dirname(export_dir)
+        os.makedirs(parent_dir, exist_ok=True)
+        temp_dir = tempfile.mkdtemp(dir=parent_dir, prefix=".export-")
+        try:
+            self.model.save_pretrained(temp_dir)
+            os.replace(temp_dir, export_dir)
+        except OSError as e:
+            # Another worker may have finished the same export first
+            logger.warning(f"Could not save ONNX export to {export_dir}: {str(e)}")
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        except BaseException:
+            # Includes interrupts, which would otherwise strand the temporary directory
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+
+    def generate(self, input_ids, **generation_kwargs):
+        return self.model.generate(input_ids, **generation_kwargs)
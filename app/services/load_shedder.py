@@ -0,0 +1,258 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+import logging
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+# Lower rank is served first when requests are waiting for the model
+PRIORITY_CLASSES = {
+    "interactive": 0,
+    "bulk": 1
+}
+
+class RequestRejected(Exception):
+    """Raised when a request is shed before it reaches the model"""
+
+    def __init__(self, status_code, detail, reason):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.reason = reason
+
+class PriorityGate:
+    """Limits concurrent inference, admitting waiting requests by priority then arrival order"""
+
+    def __init__(self, slots):
+        self.slots = slots
+        self.active = 0
+        self.waiters = []
+        self.counter = itertools.count()
+
+    def queue_depth(self, priority=None):
+        return sum(
+            1 for rank, _, future in self.waiters
+            if not future.done() and (priority is None or rank == PRIORITY_CLASSES[priority])
+        )
+
+    async def acquire(self, priority):
+        if self.active < self.slots and self.queue_depth() == 0:
+            self.active += 1
+            return
+
+        future = asyncio.get_event_loop().create_future()
+        heapq.heappush(self.waiters, (PRIORITY_CLASSES[priority], next(self.counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The slot was handed over just before cancellation, so pass it on
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        # Hand the slot straight to the next live waiter rather than freeing it
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+class LoadShedder:
+    """Admission control for summarisation requests: priorities, per-client limits, deadlines and degradation"""
+
+    def __init__(self):
+        # The summariser tracks a single current job and counts forward passes on the
+        # shared model, so it is not safe to run more than one inference at a time
+        slots = int(os.environ.get("MAX_CONCURRENT_INFERENCE", "1"))
+        if slots != 1:
+            logger.warning(f"MAX_CONCURRENT_INFERENCE={slots} is not supported, using 1")
+        self.gate = PriorityGate(1)
+
+        # Requests beyond these queue depths are shed rather than queued
+        self.max_queue_depth = {
+            "interactive": int(os.environ.get("MAX_QUEUE_DEPTH_INTERACTIVE", "32")),
+            "bulk": int(os.environ.get("MAX_QUEUE_DEPTH_BULK", "8"))
+        }
+
+        # Per-client limits, keyed by a recognised API key or the client address
+        self.rate_limit_per_minute = int(os.environ.get("RATE_LIMIT_PER_MINUTE", "60"))
+        self.max_concurrent_per_client = int(os.environ.get("MAX_CONCURRENT_PER_CLIENT", "4"))
+
+        # Requests that waited longer than this for the model get a cheaper summary
+        self.degrade_queue_seconds = float(os.environ.get("DEGRADE_QUEUE_SECONDS", "10"))
+
+        self.bulk_api_keys = {
+            key.strip() for key in os.environ.get("BULK_API_KEYS", "").split(",") if key.strip()
+        }
+        # Only configured keys identify a client; any other key could be rotated to dodge limits
+        self.api_keys = self.bulk_api_keys | {
+            key.strip() for key in os.environ.get("API_KEYS", "").split(",") if key.strip()
+        }
+
+        # Reverse proxies in front of the app (1 on Hugging Face Spaces); each appends the
+        # address it received the request from to X-Forwarded-For
+        self.trusted_proxy_count = int(os.environ.get("TRUSTED_PROXY_COUNT", "0"))
+
+        self.client_tokens = {}
+        self.last_bucket_sweep = 0
+        self.client_in_flight = {}
+
+        self.metrics = {
+            "admitted": {name: 0 for name in PRIORITY_CLASSES},
+            "shed": {
+                "queue_full": 0,
+                "rate_limited": 0,
+                "client_concurrency": 0,
+                "deadline_expired": 0
+            },
+            "degraded": 0
+        }
+
+    def classify(self, request):
+        """Return the (client_id, priority) for an incoming HTTP request"""
+        api_key = request.headers.get("x-api-key")
+        if api_key not in self.api_keys:
+            api_key = None
+        client_id = api_key or self.get_client_address(request)
+
+        # API keys registered as bulk cannot promote themselves with the header
+        if api_key in self.bulk_api_keys:
+            return client_id, "bulk"
+
+        priority = request.headers.get("x-request-priority", "interactive").lower()
+        if priority not in PRIORITY_CLASSES:
+            priority = "interactive"
+
+        return client_id, priority
+
+    def get_client_address(self, request):
+        """Return the client address, looking through trusted proxies"""
+        if self.trusted_proxy_count > 0:
+            forwarded = [
+                address.strip() for address in request.headers.get("x-forwarded-for", "").split(",")
+                if address.strip()
+            ]
+            # Entries left of those added by our own proxies are client-controlled
+            if len(forwarded) >= self.trusted_proxy_count:
+                return forwarded[-self.trusted_proxy_count]
+
+        return request.client.host if request.client else "unknown"
+
+    def get_deadline(self, request):
+        """Return the client deadline as a unix timestamp, if one was sent"""
+        deadline = request.headers.get("x-request-deadline")
+        if deadline is None:
+            return None
+        try:
+            deadline = float(deadline)
+        except ValueError:
+            return None
+
+        # A NaN deadline would never expire, so treat non-finite values as missing
+        return deadline if math.isfinite(deadline) else None
+
+    def reject(self, status_code, detail, reason):
+        self.metrics["shed"][reason] += 1
+        logger.warning(f"Shedding request ({reason}): {detail}")
+        raise RequestRejected(status_code, detail, reason)
+
+    def refill(self, client_id, now):
+        tokens, last_refill = self.client_tokens.get(client_id, (self.rate_limit_per_minute, now))
+        return min(self.rate_limit_per_minute, tokens + (now - last_refill) * self.rate_limit_per_minute / 60)
+
+    def sweep_buckets(self, now):
+        # A bucket that has refilled to full is the same as no bucket, so drop it
+        if now - self.last_bucket_sweep < 1:
+            return
+        self.last_bucket_sweep = now
+        for client_id in list(self.client_tokens):
+            if self.refill(client_id, now) >= self.rate_limit_per_minute:
+                del self.client_tokens[client_id]
+
+    def check_rate_limit(self, client_id):
+        # Token bucket refilled continuously up to one minute's allowance
+        now = time.time()
+        self.sweep_buckets(now)
+        tokens = self.refill(client_id, now)
+
+        if tokens < 1:
+            self.client_tokens[client_id] = (tokens, now)
+            self.reject(429, "Rate limit exceeded, please retry later", "rate_limited")
+
+        self.client_tokens[client_id] = (tokens - 1, now)
+
+    def check_deadline(self, deadline):
+        if deadline is not None and time.time() >= deadline:
+            self.reject(504, "Request deadline passed before processing started", "deadline_expired")
+
+    @asynccontextmanager
+    async def admit(self, request):
+        """
+        Wait for a model slot, shedding the request if it cannot be served in time.
+
+        Yields:
+            dict: The priority class, queue wait and whether to degrade the summary
+        """
+        client_id, priority = self.classify(request)
+        deadline = self.get_deadline(request)
+
+        self.check_deadline(deadline)
+
+        if self.client_in_flight.get(client_id, 0) >= self.max_concurrent_per_client:
+            self.reject(429, "Too many concurrent requests for this client", "client_concurrency")
+
+        # Checked before taking a rate limit token, so shed requests are not charged for
+        if self.gate.queue_depth(priority) >= self.max_queue_depth[priority]:
+            self.reject(503, "Server is overloaded, please retry later", "queue_full")
+
+        self.check_rate_limit(client_id)
+
+        self.client_in_flight[client_id] = self.client_in_flight.get(client_id, 0) + 1
+        try:
+            queued_at = time.time()
+            await self.gate.acquire(priority)
+            try:
+                queue_seconds = time.time() - queued_at
+
+                # The client may have given up while the request was queued
+                self.check_deadline(deadline)
+
+                degrade = queue_seconds > self.degrade_queue_seconds
+                if degrade:
+                    self.metrics["degraded"] += 1
+                self.metrics["admitted"][priority] += 1
+
+                yield {
+                    "priority": priority,
+                    "queue_seconds": round(queue_seconds, 3),
+                    "degrade": degrade
+                }
+            finally:
+                self.gate.release()
+        finally:
+            self.client_in_flight[client_id] -= 1
+            if self.client_in_flight[client_id] == 0:
+                del self.client_in_flight[client_id]
+
+    def requests_ahead(self, priority):
+        """Number of requests a new request of this priority would wait behind"""
+        rank = PRIORITY_CLASSES[priority]
+        queued = sum(
+            self.gate.queue_depth(name) for name, other_rank in PRIORITY_CLASSES.items()
+            if other_rank <= rank
+        )
+        return queued + self.gate.active
+
+    def get_metrics(self):
+        """Return admission, shedding and degradation counters"""
+        return {
+            **self.metrics,
+            "queue_depth": {name: self.gate.queue_depth(name) for name in PRIORITY_CLASSES},
+            "in_flight": self.gate.active
+        }
@@ -1,17 +1,35 @@
 import numpy as np  # Import NumPy first
 import torch
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+from transformers.modeling_outputs import BaseModelOutput
 import time
 import os
 import re
 import logging
+import threading
+from app.services.inference_backend import TorchBackend, OnnxRuntimeBackend
+from app.services.cache import EncoderCache, hash_tokens
+from app.services.capacity import CapacityTracker
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Small draft model sharing BART's vocabulary, used as the fallback model and
+# as the assistant for assisted (speculative) generation
+ASSISTANT_MODEL_NAME = "sshleifer/distilbart-cnn-6-6"
+
+# Backoff before retrying a failed draft model load, doubling up to the maximum
+ASSISTANT_RETRY_SECONDS = 30
+ASSISTANT_RETRY_MAX_SECONDS = 900
+
 class SummariserService:
-    def __init__(self):
+    def __init__(self, backend=None):
+        """
+        Args:
+            backend (InferenceBackend): Backend to generate with instead of the one
+                selected by the INFERENCE_BACKEND setting ("torch" or "onnx")
+        """
         # Status tracking
         self.model_loading_status = {
             "is_loading": False,
@@ -37,6 +55,11 @@ class SummariserService:
         # Ensure cache directory exists and is writable
         cache_dir = os.environ.get("TRANSFORMERS_CACHE", "/tmp/huggingface_cache")
         os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+
+        # Move to GPU if available
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.backend_name = os.environ.get("INFERENCE_BACKEND", "torch").lower()
 
         try:
             self.tokenizer = AutoTokenizer.from_pretrained(
@@ -46,23 +69,14 @@ class SummariserService:
             )
 
             self.model_loading_status["step"] = "Loading model"
-            self.model = AutoModelForSeq2SeqLM.from_pretrained(
-                model_name,
-                cache_dir=cache_dir,
-                force_download=False,
-                local_files_only=False
-            )
-
-            # Move to GPU if available
-            self.device = "cuda" if torch.cuda.is_available() else "cpu"
-            self.model.to(self.device)
+            self.backend = backend or self.load_backend(model_name)
 
         except Exception as e:
             # Fallback to a smaller model if the main one fails
             print(f"Error loading model {model_name}: {str(e)}")
             print("Falling back to smaller model...")
 
-            fallback_model = "sshleifer/distilbart-cnn-6-6"  # Much smaller model
+            fallback_model = ASSISTANT_MODEL_NAME  # Much smaller model
 
             self.tokenizer = AutoTokenizer.from_pretrained(
                 fallback_model,
@@ -70,25 +84,35 @@ class SummariserService:
                 local_files_only=False
             )
 
-            self.model = AutoModelForSeq2SeqLM.from_pretrained(
-                fallback_model,
-                cache_dir=cache_dir,
-                force_download=False,
-                local_files_only=False
-            )
-
-            self.device = "cuda" if torch.cuda.is_available() else "cpu"
-            self.model.to(self.device)
+            self.backend = backend or self.load_backend(fallback_model)
 
             # Update model name for metadata
             model_name = fallback_model
 
+        # ONNX Runtime runs on CPU regardless of GPU availability
+        self.device = self.backend.device
+
         self.model_loading_status["is_loading"] = False
         self.model_loading_status["progress"] = 100
 
         # Store the actual model name used
         self.model_name = model_name
 
+        # Assisted generation and degradation: the draft model is loaded in the background
+        self.use_assisted_generation = os.environ.get("USE_ASSISTED_GENERATION", "false").lower() in ("1", "true", "yes")
+        self.assistant_model = None
+        self.assistant_loading = False
+        self.assistant_failures = 0
+        self.assistant_retry_at = 0
+        self.assistant_loader = None
+        self.assistant_lock = threading.Lock()
+
+        # Encoder outputs keyed by token sequence, so repeated texts only pay decoder cost
+        self.encoder_cache = EncoderCache(int(os.environ.get("ENCODER_CACHE_SIZE", "16")))
+
+        # Latency and throughput statistics for the capacity endpoint
+        self.capacity = CapacityTracker(decode_includes_encode=not self.backend.supports_encoder_reuse)
+
         # Track current processing job
         self.current_job = {
             "in_progress": False,
@@ -122,11 +146,164 @@ class SummariserService:
 
         return summary
 
+    def load_backend(self, model_name):
+        """Create the configured inference backend for the given model"""
+        if self.backend_name not in ("torch", "onnx"):
+            logger.warning(f"Unknown INFERENCE_BACKEND '{self.backend_name}', expected 'torch' or 'onnx'; using torch")
+
+        if self.backend_name == "onnx":
+            try:
+                return OnnxRuntimeBackend(model_name, self.cache_dir)
+            except Exception as e:
+                # Covers a missing optimum install as well as export or load failures
+                logger.warning(f"ONNX Runtime backend unavailable ({str(e)}), falling back to torch")
+
+        model = AutoModelForSeq2SeqLM.from_pretrained(
+            model_name,
+            cache_dir=self.cache_dir,
+            force_download=False,
+            local_files_only=False
+        )
+        model.to(self.device)
+
+        return TorchBackend(model, self.device)
+
+    def encode(self, input_ids):
+        """
+        Return encoder hidden states for the input, reusing cached outputs.
+
+        Returns:
+            tuple: The encoder hidden states and whether they came from the cache
+        """
+        key = (self.model_name, hash_tokens(input_ids[0].tolist()))
+        encoder_hidden_states = self.encoder_cache.get(key)
+        if encoder_hidden_states is not None:
+            return encoder_hidden_states, True
+
+        encode_start = time.time()
+        encoder_hidden_states = self.backend.encode(input_ids)
+        self.capacity.record_encode(len(input_ids[0]), time.time() - encode_start)
+        self.encoder_cache.put(key, encoder_hidden_states)
+        return encoder_hidden_states, False
+
+    def load_assistant_model(self):
+        """Load the draft model, blocking; a failed load is retried after a backoff"""
+        try:
+            logger.info(f"Loading assistant model {ASSISTANT_MODEL_NAME}")
+            assistant_model = AutoModelForSeq2SeqLM.from_pretrained(
+                ASSISTANT_MODEL_NAME,
+                cache_dir=self.cache_dir,
+                force_download=False,
+                local_files_only=False
+            )
+            assistant_model.to(self.device)
+            self.assistant_model = assistant_model
+            self.assistant_failures = 0
+        except Exception as e:
+            self.assistant_failures += 1
+            backoff = min(ASSISTANT_RETRY_MAX_SECONDS, ASSISTANT_RETRY_SECONDS * 2 ** (self.assistant_failures - 1))
+            self.assistant_retry_at = time.time() + backoff
+            logger.warning(f"Error loading assistant model {ASSISTANT_MODEL_NAME}, retrying in {backoff}s: {str(e)}")
+        finally:
+            self.assistant_loading = False
+
+    def preload_assistant_model(self):
+        """Start loading the draft model in the background, unless loaded, loading or backing off"""
+        # Assisting the draft model with itself would only add overhead
+        if self.model_name == ASSISTANT_MODEL_NAME:
+            return
+
+        with self.assistant_lock:
+            if self.assistant_model is not None or self.assistant_loading or time.time() < self.assistant_retry_at:
+                return
+            self.assistant_loading = True
+
+        self.assistant_loader = threading.Thread(target=self.load_assistant_model, daemon=True)
+        self.assistant_loader.start()
+
+    def get_assistant_model(self):
+        """Return the draft model if it is ready, without ever blocking a request on loading it"""
+        if self.model_name == ASSISTANT_MODEL_NAME:
+            return None
+
+        if self.assistant_model is None:
+            self.preload_assistant_model()
+
+        return self.assistant_model
+
+    def generate_assisted(self, input_ids, assistant_model, **generation_kwargs):
+        """
+        Run assisted generation and collect draft acceptance statistics.
+
+        The draft model proposes tokens one forward pass at a time and the main
+        model verifies each batch of proposals in a single forward pass, so
+        counting forward passes on both models gives the acceptance rate.
+
+        Returns:
+            tuple: The generated token IDs and a dict of assisted generation stats
+        """
+        model = self.backend.model
+        forward_counts = {"target": 0, "draft": 0}
+
+        def count_forward(key):
+            def hook(module, inputs, outputs):
+                forward_counts[key] += 1
+            return hook
+
+        handles = [
+            model.register_forward_hook(count_forward("target")),
+            assistant_model.register_forward_hook(count_forward("draft")),
+        ]
+
+        start_time = time.time()
+        try:
+            summary_ids = model.generate(
+                input_ids,
+                assistant_model=assistant_model,
+                **generation_kwargs
+            )
+        finally:
+            for handle in handles:
+                handle.remove()
+        generation_time = time.time() - start_time
+
+        # Exclude the decoder start token; every main model pass yields the
+        # accepted draft tokens plus one token of its own
+        generated_tokens = max(0, len(summary_ids[0]) - 1)
+        target_passes = forward_counts["target"]
+        draft_passes = forward_counts["draft"]
+        accepted_tokens = max(0, generated_tokens - target_passes)
+
+        stats = {
+            "assistant_model": ASSISTANT_MODEL_NAME,
+            "generated_tokens": generated_tokens,
+            "draft_tokens_proposed": draft_passes,
+            "draft_tokens_accepted": accepted_tokens,
+            "acceptance_rate": round(accepted_tokens / draft_passes, 3) if draft_passes else 0.0,
+            # Upper bound on the speedup over plain greedy decoding, ignoring the draft model's cost
+            "tokens_per_target_pass": round(generated_tokens / target_passes, 2) if target_passes else 1.0,
+            "generation_time_seconds": round(generation_time, 3),
+        }
+
+        return summary_ids, stats
+
+    def predict_decoding_strategy(self, do_sample=False, use_assisted_generation=None):
+        """Return the decoding strategy summarise() would use for a non-degraded request right now"""
+        if use_assisted_generation is None:
+            use_assisted_generation = self.use_assisted_generation
+
+        if (use_assisted_generation and not do_sample and self.backend.supports_assisted_generation
+                and self.assistant_model is not None and self.model_name != ASSISTANT_MODEL_NAME):
+            return "assisted_greedy"
+        return "sampling" if do_sample else "beam_search"
+
     def get_status(self):
         """Return the current status of the summarizer service"""
         status = {
             "model_loading": self.model_loading_status,
             "device": self.device,
+            "inference_backend": self.backend.name,
+            "assistant_model_loaded": self.assistant_model is not None,
             "current_job": self.current_job
         }
 
@@ -144,7 +321,7 @@ class SummariserService:
 
         return status
 
-    def summarise(self, text, max_length=250, min_length=100, do_sample=True, temperature=1.2):
+    def summarise(self, text, max_length=250, min_length=100, do_sample=True, temperature=1.2, use_assisted_generation=None, degrade=False, lengths=None):
         """
         Summarise the given text using the loaded model.
 
@@ -154,10 +331,22 @@ class SummariserService:
             min_length (int): Minimum length of the summary in characters
             do_sample (bool): Whether to use sampling for generation
             temperature (float): Sampling temperature (higher = more random)
+            use_assisted_generation (bool): Whether to use the draft model to speed up
+                greedy decoding (defaults to the USE_ASSISTED_GENERATION setting)
+            degrade (bool): Whether to use the cheaper draft model, or extractive mode
+                if it is unavailable, instead of the main model (used under overload)
+            lengths (list): Optional (max_length, min_length) pairs to summarise the text
+                at several lengths in one call, sharing a single encoder pass
 
         Returns:
-            dict: The generated summary and processing metadata
+            dict: The generated summary (the first length when several are requested),
+                the per-length summaries and processing metadata
         """
+        # The response shape depends only on whether lengths were supplied, not on how many
+        lengths_requested = bool(lengths)
+        if not lengths:
+            lengths = [(max_length, min_length)]
+
         logger.info(f"Starting summarization of text with {len(text)} characters")
 
         # Reset and start job tracking
@@ -176,7 +365,8 @@ class SummariserService:
                 "input_word_count": self.current_job["input_word_count"],
                 "estimated_time_seconds": self.current_job["estimated_time"],
                 "model_used": self.model_name,
-                "processing_device": self.device
+                "processing_device": self.device,
+                "inference_backend": self.backend.name
             }
         }
 
@@ -197,35 +387,137 @@ class SummariserService:
             self.current_job["stage"] = "Generating summary"
             self.current_job["progress"] = 30
 
-            # Enhanced generation parameters for better web content summarization
-            summary_ids = self.model.generate(
-                input_ids,
-                max_length=max_length,
-                min_length=min_length,
-                do_sample=do_sample,
-                temperature=temperature,
-                num_beams=5,  # Increased from 4 to 5
-                early_stopping=True,
-                no_repeat_ngram_size=3,
-                length_penalty=2.0,
-                top_k=50,  # Added for better quality
-                top_p=0.95,  # Added for better quality
-            )
+            if use_assisted_generation is None:
+                use_assisted_generation = self.use_assisted_generation
+
+            # Assisted generation only reproduces greedy decoding, so it is skipped when sampling
+            assistant_model = None
+            if use_assisted_generation and not do_sample and not degrade and self.backend.supports_assisted_generation:
+                assistant_model = self.get_assistant_model()
+
+            cheap_model = None
+            use_extractive = False
+            if degrade:
+                result["metadata"]["degraded"] = True
+                if self.model_name == ASSISTANT_MODEL_NAME:
+                    cheap_model = self.backend
+                else:
+                    cheap_model = self.get_assistant_model()
+
+                if cheap_model is not None:
+                    result["metadata"]["model_used"] = ASSISTANT_MODEL_NAME
+                else:
+                    # Also used until the draft model has finished loading
+                    result["metadata"]["model_used"] = "extractive"
+                    use_extractive = True
+
+            # Assisted and degraded generation decode greedily instead of with beam search
+            if use_extractive:
+                result["metadata"]["decoding_strategy"] = "extractive"
+                result["metadata"]["num_beams"] = 0
+            elif cheap_model is not None or assistant_model is not None:
+                result["metadata"]["decoding_strategy"] = "assisted_greedy" if assistant_model is not None else "greedy"
+                result["metadata"]["num_beams"] = 1
+            else:
+                result["metadata"]["decoding_strategy"] = "sampling" if do_sample else "beam_search"
+                result["metadata"]["num_beams"] = 5
+
+            # Run the encoder once (or not at all on a cache hit) and share it across all lengths
+            encoder_hidden_states = None
+            if not degrade and self.backend.supports_encoder_reuse:
+                encoder_hidden_states, cache_hit = self.encode(input_ids)
+                result["metadata"]["encoder_cache"] = {
+                    "hit": cache_hit,
+                    "reuses": int(cache_hit) + len(lengths) - 1
+                }
+
+            summaries = []
+            for length_max, length_min in lengths:
+                entry = {"max_length": length_max, "min_length": length_min}
+                generation_kwargs = {}
+                if encoder_hidden_states is not None:
+                    # generate expands encoder outputs in place for beam search, so wrap the cached tensor afresh
+                    generation_kwargs["encoder_outputs"] = BaseModelOutput(last_hidden_state=encoder_hidden_states)
+
+                if use_extractive:
+                    summary = self.extractive_summary(text, length_max)
+                else:
+                    decode_start = time.time()
+                    if cheap_model is not None:
+                        # Greedy decoding on the draft model is far cheaper than beam search on BART
+                        summary_ids = cheap_model.generate(
+                            input_ids,
+                            max_length=length_max,
+                            min_length=length_min,
+                            do_sample=False,
+                            num_beams=1,
+                            no_repeat_ngram_size=3,
+                        )
+                    elif assistant_model is not None:
+                        summary_ids, entry["assisted_generation"] = self.generate_assisted(
+                            input_ids,
+                            assistant_model,
+                            max_length=length_max,
+                            min_length=length_min,
+                            do_sample=False,
+                            num_beams=1,
+                            no_repeat_ngram_size=3,
+                            **generation_kwargs
+                        )
+                    else:
+                        # Enhanced generation parameters for better web content summarization
+                        summary_ids = self.backend.generate(
+                            input_ids,
+                            max_length=length_max,
+                            min_length=length_min,
+                            do_sample=do_sample,
+                            temperature=temperature,
+                            num_beams=5,  # Increased from 4 to 5
+                            early_stopping=True,
+                            no_repeat_ngram_size=3,
+                            length_penalty=2.0,
+                            top_k=50,  # Added for better quality
+                            top_p=0.95,  # Added for better quality
+                            **generation_kwargs
+                        )
+
+                    # Degraded requests count towards throughput, but running a different model
+                    # they would skew the main model's latency averages
+                    decode_seconds = time.time() - decode_start
+                    self.capacity.record_tokens(len(summary_ids[0]), decode_seconds)
+                    if cheap_model is None:
+                        self.capacity.record_decode(
+                            len(summary_ids[0]),
+                            decode_seconds,
+                            result["metadata"]["decoding_strategy"]
+                        )
+
+                    summary = self.tokenizer.decode(summary_ids[0], skip_special_tokens=True)
+
+                # Clean and format the summary
+                entry["summary"] = self.clean_summary(summary)
+                entry["output_word_count"] = len(entry["summary"].split())
+                summaries.append(entry)
 
             # Update job status
             self.current_job["stage"] = "Post-processing summary"
             self.current_job["progress"] = 90
 
-            summary = self.tokenizer.decode(summary_ids[0], skip_special_tokens=True)
-
-            # Clean and format the summary
-            summary = self.clean_summary(summary)
+            # The first requested length is the primary summary
+            summary = summaries[0]["summary"]
+            if "assisted_generation" in summaries[0]:
+                result["metadata"]["assisted_generation"] = summaries[0]["assisted_generation"]
 
             result["summary"] = summary
+            if lengths_requested:
+                result["summaries"] = summaries
             result["metadata"]["output_word_count"] = len(summary.split())
             result["metadata"]["compression_ratio"] = round(len(summary.split()) / self.current_job["input_word_count"] * 100, 1)
 
-            logger.info(f"Generated summary with {len(summary)} characters")
+            if not degrade:
+                self.capacity.record_request(time.time() - self.current_job["start_time"])
+
+            logger.info(f"Generated {len(summaries)} summaries, the first with {len(summary)} characters")
 
         except Exception as e:
             logger.error(f"Error during summarization: {str(e)}")
@@ -239,6 +531,27 @@ class SummariserService:
 
         return result
 
+    def extractive_summary(self, text, max_length):
+        """Build a lead-based summary from the opening sentences without running a model"""
+        # Roughly three words for every four tokens
+        max_words = max(1, int(max_length * 0.75))
+
+        sentences = re.split(r'(?<=[.!?])\s+', text.strip())
+        selected = []
+        word_count = 0
+        for sentence in sentences:
+            sentence_words = len(sentence.split())
+            if selected and word_count + sentence_words > max_words:
+                break
+            selected.append(sentence)
+            word_count += sentence_words
+
+        summary = " ".join(selected)
+        if len(summary.split()) > max_words:
+            summary = " ".join(summary.split()[:max_words])
+
+        return summary
+
     def preprocess_text(self, text):
         """Preprocess text to improve summarization quality."""
         # Remove excessive whitespace
@@ -45,7 +45,9 @@ async def root():
             "api_endpoints": {
                 "summarise_text": "/api/summarise",
                 "summarise_url": "/api/summarise-url",
-                "status": "/api/status"
+                "status": "/api/status",
+                "metrics": "/api/metrics",
+                "capacity": "/api/capacity"
             }
         },
         "github_repository": "https://github.com/dang-w/ai-content-summariser-api",
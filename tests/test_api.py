@@ -1,10 +1,16 @@
 from fastapi.testclient import TestClient
+from types import SimpleNamespace
+import asyncio
+import heapq
 import sys
 import os
 
 # Import the app from the parent directory
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from main import app
+from app.api import routes
+from app.services.capacity import CapacityTracker
+from app.services.load_shedder import LoadShedder, PRIORITY_CLASSES
 
 client = TestClient(app)
 
@@ -22,3 +28,59 @@ def test_summarise_endpoint():
     assert "summary" in data
     assert "original_text_length" in data
     assert "summary_length" in data
+
+def queue_waiters(shedder, priorities):
+    # Park futures in the gate as if requests were waiting for the model
+    loop = asyncio.new_event_loop()
+    for priority in priorities:
+        heapq.heappush(
+            shedder.gate.waiters,
+            (PRIORITY_CLASSES[priority], next(shedder.gate.counter), loop.create_future())
+        )
+    return loop
+
+def test_capacity_endpoint(monkeypatch):
+    capacity = CapacityTracker(smoothing=1.0)
+    capacity.record_encode(100, 0.1)
+    capacity.record_decode(100, 2.0, "beam_search")
+    capacity.record_request(3.0)
+    summariser_stub = SimpleNamespace(
+        capacity=capacity,
+        predict_decoding_strategy=lambda do_sample, use_assisted_generation: "sampling" if do_sample else "beam_search"
+    )
+    monkeypatch.setattr(routes, "summariser_service", summariser_stub)
+
+    shedder = LoadShedder()
+    shedder.gate.active = 1
+    loop = queue_waiters(shedder, ["bulk", "interactive", "bulk"])
+    monkeypatch.setattr(routes, "load_shedder", shedder)
+
+    try:
+        response = client.get("/api/capacity", params={"input_tokens": 200, "max_length": 50})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["queue_depth"] == {"interactive": 1, "bulk": 2}
+        assert data["in_flight"] == 1
+        assert data["warm"] is True
+
+        # Interactive requests only wait behind queued interactive requests and the running one
+        prediction = data["predicted_wait"]
+        assert prediction["requests_ahead"] == 2
+        assert prediction["decoding_strategy"] == "beam_search"
+        assert prediction["queue_seconds"] == 6.0
+        assert prediction["service_seconds"] == 1.2
+
+        # Sampling has no timings yet, so its own prior is used rather than the beam search average
+        response = client.get("/api/capacity", params={"input_tokens": 200, "max_length": 50, "do_sample": True})
+        assert response.json()["predicted_wait"]["decoding_strategy"] == "sampling"
+        assert response.json()["predicted_wait"]["service_seconds"] == 2.7
+
+        response = client.get("/api/capacity", params={"input_tokens": 200, "max_length": 50, "priority": "bulk"})
+        assert response.status_code == 200
+        assert response.json()["predicted_wait"]["requests_ahead"] == 4
+        assert response.json()["predicted_wait"]["queue_seconds"] == 12.0
+
+        response = client.get("/api/capacity", params={"priority": "urgent"})
+        assert response.status_code == 422
+    finally:
+        loop.close()
@@ -0,0 +1,84 @@
+import time
+import pytest
+import sys
+import os
+
+# Import the CapacityTracker from the parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.services.capacity import CapacityTracker
+
+def test_capacity_tracker_moving_averages_and_throughput():
+    tracker = CapacityTracker(window_seconds=10, smoothing=0.5)
+    assert tracker.get_stats()["warm"] is False
+
+    tracker.record_encode(500, 1.0)
+    tracker.record_decode(100, 4.0, "beam_search")
+    tracker.record_decode(100, 2.0, "beam_search")
+    tracker.record_tokens(100, 4.0)
+    tracker.record_tokens(100, 2.0)
+    tracker.record_request(5.0)
+
+    stats = tracker.get_stats()
+    assert stats["warm"] is True
+    assert stats["encode_seconds_per_token"] == pytest.approx(0.002)
+    # Moving average of 0.04 and 0.02 seconds per token with equal weighting
+    assert stats["decode_seconds_per_token"] == {"beam_search": pytest.approx(0.03)}
+    # 200 tokens over the 4 seconds covered so far, not the whole 10 second window
+    assert stats["tokens_per_second"] == pytest.approx(50.0, rel=1e-2)
+    assert stats["completed_requests"] == 1
+
+def test_capacity_tracker_throughput_is_capped_at_the_window():
+    tracker = CapacityTracker(window_seconds=10)
+
+    # A sample that started before the window only spreads over the window
+    tracker.record_tokens(100, 20.0)
+    assert tracker.tokens_per_second() == pytest.approx(10.0)
+
+    # Samples older than the window are dropped
+    tracker.generated[0] = (time.time() - 11, 100, time.time() - 31)
+    assert tracker.tokens_per_second() == 0.0
+
+def test_capacity_tracker_predicts_wait_from_requests_ahead():
+    tracker = CapacityTracker(smoothing=1.0)
+    tracker.record_encode(100, 0.1)
+    tracker.record_decode(100, 2.0, "beam_search")
+    tracker.record_request(3.0)
+
+    prediction = tracker.predict_wait(input_tokens=200, output_tokens=50, requests_ahead=4, slots=2)
+    assert prediction["decoding_strategy"] == "beam_search"
+    assert prediction["service_seconds"] == pytest.approx(1.2)
+    assert prediction["queue_seconds"] == pytest.approx(6.0)
+    assert prediction["total_seconds"] == pytest.approx(7.2)
+
+def test_capacity_tracker_keeps_latency_per_decoding_strategy():
+    tracker = CapacityTracker(smoothing=1.0)
+    tracker.record_encode(100, 0.1)
+    tracker.record_decode(100, 5.0, "beam_search")
+    tracker.record_decode(100, 1.0, "assisted_greedy")
+
+    assert tracker.estimate_service_seconds(100, 100, "beam_search") == pytest.approx(5.1)
+    assert tracker.estimate_service_seconds(100, 100, "assisted_greedy") == pytest.approx(1.1)
+
+    # Unmeasured strategies fall back to their own prior, not another strategy's timings
+    assert tracker.estimate_service_seconds(100, 100, "sampling") == pytest.approx(0.1 + 100 * 0.05)
+
+def test_capacity_tracker_does_not_count_encoder_twice():
+    tracker = CapacityTracker(smoothing=1.0, decode_includes_encode=True)
+
+    # Before any timings the priors for both stages apply
+    cold = tracker.estimate_service_seconds(input_tokens=500, output_tokens=100)
+    assert cold == pytest.approx(500 * 0.002 + 100 * 0.05)
+
+    # Once measured, decode timings already cover the encoder
+    tracker.record_decode(100, 3.0, "beam_search")
+    assert tracker.estimate_service_seconds(input_tokens=500, output_tokens=100) == pytest.approx(3.0)
+
+def test_capacity_tracker_throughput_counts_tokens_without_latency_samples():
+    tracker = CapacityTracker(window_seconds=10)
+
+    # Degraded requests only contribute tokens
+    tracker.record_tokens(50, 10.0)
+
+    stats = tracker.get_stats()
+    assert stats["tokens_per_second"] == pytest.approx(5.0, rel=1e-2)
+    assert stats["decode_seconds_per_token"] == {}
@@ -0,0 +1,146 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Import the LoadShedder from the parent directory
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.services.load_shedder import LoadShedder, RequestRejected, PRIORITY_CLASSES
+
+def make_request(headers=None, host="127.0.0.1"):
+    request = MagicMock()
+    request.headers = headers or {}
+    request.client.host = host
+    return request
+
+def test_interactive_requests_jump_the_bulk_queue():
+    shedder = LoadShedder()
+    order = []
+
+    async def summarise(name, priority, delay):
+        await asyncio.sleep(delay)
+        request = make_request({"x-request-priority": priority}, host=name)
+        async with shedder.admit(request) as admission:
+            order.append((name, admission["priority"]))
+            await asyncio.sleep(0.01)
+
+    async def run():
+        # The first bulk request holds the model while the others queue up
+        await asyncio.gather(
+            summarise("bulk-1", "bulk", 0),
+            summarise("bulk-2", "bulk", 0.001),
+            summarise("frontend", "interactive", 0.002),
+        )
+
+    asyncio.run(run())
+
+    assert order == [("bulk-1", "bulk"), ("frontend", "interactive"), ("bulk-2", "bulk")]
+    assert shedder.get_metrics()["admitted"] == {"interactive": 1, "bulk": 2}
+
+def test_bulk_api_key_cannot_promote_itself(monkeypatch):
+    monkeypatch.setenv("BULK_API_KEYS", "batch-key")
+    shedder = LoadShedder()
+
+    request = make_request({"x-api-key": "batch-key", "x-request-priority": "interactive"})
+    assert shedder.classify(request) == ("batch-key", "bulk")
+
+def test_expired_deadline_and_rate_limit_are_shed(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_PER_MINUTE", "1")
+    shedder = LoadShedder()
+
+    async def admit(request):
+        async with shedder.admit(request):
+            pass
+
+    with pytest.raises(RequestRejected) as excinfo:
+        asyncio.run(admit(make_request({"x-request-deadline": str(time.time() - 1)})))
+    assert excinfo.value.status_code == 504
+
+    asyncio.run(admit(make_request()))
+    with pytest.raises(RequestRejected) as excinfo:
+        asyncio.run(admit(make_request()))
+    assert excinfo.value.status_code == 429
+
+    shed = shedder.get_metrics()["shed"]
+    assert shed["deadline_expired"] == 1
+    assert shed["rate_limited"] == 1
+
+def test_unknown_api_keys_do_not_get_fresh_limits(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_PER_MINUTE", "1")
+    monkeypatch.setenv("API_KEYS", "frontend-key")
+    shedder = LoadShedder()
+
+    async def admit(request):
+        async with shedder.admit(request):
+            pass
+
+    asyncio.run(admit(make_request({"x-api-key": "made-up-1"})))
+    with pytest.raises(RequestRejected):
+        asyncio.run(admit(make_request({"x-api-key": "made-up-2"})))
+
+    # Both unknown keys share the address bucket; a configured key gets its own
+    assert list(shedder.client_tokens) == ["127.0.0.1"]
+    asyncio.run(admit(make_request({"x-api-key": "frontend-key"})))
+    assert shedder.classify(make_request({"x-api-key": "frontend-key"}))[0] == "frontend-key"
+
+def test_full_rate_limit_buckets_are_dropped():
+    shedder = LoadShedder()
+    shedder.client_tokens = {
+        "idle-client": (shedder.rate_limit_per_minute - 1, time.time() - 120),
+        "busy-client": (0, time.time())
+    }
+
+    shedder.check_rate_limit("new-client")
+
+    assert set(shedder.client_tokens) == {"busy-client", "new-client"}
+
+def test_clients_behind_proxy_are_keyed_on_forwarded_address(monkeypatch):
+    monkeypatch.setenv("TRUSTED_PROXY_COUNT", "1")
+    shedder = LoadShedder()
+
+    # Every request arrives from the proxy's address
+    first = make_request({"x-forwarded-for": "203.0.113.5"}, host="10.0.0.1")
+    second = make_request({"x-forwarded-for": "203.0.113.6"}, host="10.0.0.1")
+    assert shedder.classify(first)[0] == "203.0.113.5"
+    assert shedder.classify(second)[0] == "203.0.113.6"
+
+    # Entries the client prepended itself are ignored
+    spoofed = make_request({"x-forwarded-for": "198.51.100.1, 203.0.113.5"}, host="10.0.0.1")
+    assert shedder.classify(spoofed)[0] == "203.0.113.5"
+
+    # Without the header the proxy address is all there is
+    assert shedder.classify(make_request(host="10.0.0.1"))[0] == "10.0.0.1"
+
+def test_requests_ahead_counts_higher_priority_waiters():
+    shedder = LoadShedder()
+    shedder.gate.active = 1
+
+    async def run():
+        loop = asyncio.get_event_loop()
+        for priority in ["bulk", "interactive", "bulk"]:
+            shedder.gate.waiters.append((PRIORITY_CLASSES[priority], next(shedder.gate.counter), loop.create_future()))
+        return shedder.requests_ahead("interactive"), shedder.requests_ahead("bulk")
+
+    assert asyncio.run(run()) == (2, 4)
+
+def test_non_finite_deadlines_are_ignored():
+    shedder = LoadShedder()
+
+    for value in ["nan", "inf", "-inf", "soon"]:
+        assert shedder.get_deadline(make_request({"x-request-deadline": value})) is None
+    assert shedder.get_deadline(make_request({"x-request-deadline": "1700000000.5"})) == 1700000000.5
+
+def test_queue_full_rejection_does_not_use_rate_limit(monkeypatch):
+    monkeypatch.setenv("MAX_QUEUE_DEPTH_INTERACTIVE", "0")
+    shedder = LoadShedder()
+
+    async def admit(request):
+        async with shedder.admit(request):
+            pass
+
+    with pytest.raises(RequestRejected) as excinfo:
+        asyncio.run(admit(make_request()))
+    assert excinfo.value.status_code == 503
+    assert shedder.client_tokens == {}
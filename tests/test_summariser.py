@@ -1,4 +1,5 @@
 import pytest
+import time
 from unittest.mock import patch, MagicMock
 import sys
 import os
@@ -6,6 +7,7 @@ import os
 # Import the SummariserService from the parent directory
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from app.services.summariser import SummariserService
+from app.services.inference_backend import InferenceBackend, OnnxRuntimeBackend
 
 # Test with mocked model
 def test_summariser_with_mock():
@@ -70,3 +72,274 @@ def test_summariser():
     # If the summary is different from the input, check that it's shorter
     if summary != text:
         assert len(summary) < len(text) * 0.8
+
+# Test assisted generation passes the draft model through and reports stats
+def test_summariser_assisted_generation_with_mock():
+    with patch('app.services.summariser.AutoTokenizer') as mock_tokenizer_class, \
+         patch('app.services.summariser.AutoModelForSeq2SeqLM') as mock_model_class:
+
+        mock_tokenizer = MagicMock()
+        mock_tokenizer.decode.return_value = "This is a test summary."
+        mock_tokenizer_class.from_pretrained.return_value = mock_tokenizer
+
+        mock_model = MagicMock()
+        mock_model.generate.return_value = [[1, 2, 3, 4]]
+        mock_model.to.return_value = mock_model
+        mock_assistant = MagicMock()
+        mock_model_class.from_pretrained.side_effect = [mock_model, mock_assistant]
+
+        summariser = SummariserService()
+        summariser.load_assistant_model()
+
+        text = "This is a test paragraph that should be summarized."
+        result = summariser.summarise(text, max_length=50, min_length=10, do_sample=False, use_assisted_generation=True)
+
+        assert result["summary"] == "This is a test summary."
+        stats = result["metadata"]["assisted_generation"]
+        assert stats["generated_tokens"] == 3
+        assert "acceptance_rate" in stats
+        assert "tokens_per_target_pass" in stats
+        assert result["metadata"]["decoding_strategy"] == "assisted_greedy"
+        assert result["metadata"]["num_beams"] == 1
+
+        # The draft model is loaded once and handed to generate with greedy search
+        assert mock_model_class.from_pretrained.call_count == 2
+        _, kwargs = mock_model.generate.call_args
+        assert kwargs["assistant_model"] is mock_assistant
+        assert kwargs["num_beams"] == 1
+        assert kwargs["do_sample"] is False
+
+# Test the draft model loads in the background and failed loads are retried after a backoff
+def test_assistant_model_background_load_with_backoff():
+    with patch('app.services.summariser.AutoTokenizer'), \
+         patch('app.services.summariser.AutoModelForSeq2SeqLM') as mock_model_class:
+
+        mock_model = MagicMock()
+        mock_assistant = MagicMock()
+        mock_model_class.from_pretrained.side_effect = [mock_model, OSError("download failed"), mock_assistant]
+
+        summariser = SummariserService()
+
+        # Requests never wait for the load; they get no draft model until it is ready
+        assert summariser.get_assistant_model() is None
+        summariser.assistant_loader.join()
+        assert summariser.assistant_model is None
+        assert summariser.assistant_retry_at > time.time()
+
+        # While backing off, no new load is started
+        failed_loader = summariser.assistant_loader
+        assert summariser.get_assistant_model() is None
+        assert summariser.assistant_loader is failed_loader
+
+        # Once the backoff has passed, the load is retried
+        summariser.assistant_retry_at = 0
+        summariser.preload_assistant_model()
+        summariser.assistant_loader.join()
+        assert summariser.get_assistant_model() is mock_assistant
+        assert summariser.assistant_failures == 0
+
+class HookedModel:
+    """Minimal model that fires its registered forward hooks a fixed number of times per generate call"""
+
+    def __init__(self, forward_passes, output_ids=None, draft=None):
+        self.forward_passes = forward_passes
+        self.output_ids = output_ids
+        self.draft = draft
+        self.hooks = []
+
+    def register_forward_hook(self, hook):
+        self.hooks.append(hook)
+        handle = MagicMock()
+        handle.remove.side_effect = lambda: self.hooks.remove(hook)
+        return handle
+
+    def forward(self):
+        for _ in range(self.forward_passes):
+            for hook in list(self.hooks):
+                hook(self, (), None)
+
+    def generate(self, input_ids, assistant_model=None, **generation_kwargs):
+        # Interleave draft proposals with target verification like assisted decoding
+        assistant_model.forward()
+        self.forward()
+        return [self.output_ids]
+
+# Test acceptance statistics are derived from forward passes on both models
+def test_generate_assisted_acceptance_stats():
+    with patch('app.services.summariser.AutoTokenizer'), \
+         patch('app.services.summariser.AutoModelForSeq2SeqLM'):
+
+        # Decoder start token plus 12 generated tokens from 4 target passes
+        target = HookedModel(forward_passes=4, output_ids=list(range(13)))
+        draft = HookedModel(forward_passes=10)
+
+        summariser = SummariserService()
+        summariser.backend.model = target
+
+        summary_ids, stats = summariser.generate_assisted([[1, 2, 3]], draft, max_length=50)
+
+        assert summary_ids == [list(range(13))]
+        assert stats["generated_tokens"] == 12
+        assert stats["draft_tokens_proposed"] == 10
+        # Each target pass contributes one token of its own, so 12 - 4 drafts were accepted
+        assert stats["draft_tokens_accepted"] == 8
+        assert stats["acceptance_rate"] == 0.8
+        assert stats["tokens_per_target_pass"] == 3.0
+
+        # Hooks are removed once generation finishes
+        assert target.hooks == [] and draft.hooks == []
+
+# Test degraded mode falls back to an extractive summary without the draft model
+def test_summariser_degraded_extractive_with_mock():
+    with patch('app.services.summariser.AutoTokenizer') as mock_tokenizer_class, \
+         patch('app.services.summariser.AutoModelForSeq2SeqLM') as mock_model_class:
+
+        mock_tokenizer_class.from_pretrained.return_value = MagicMock()
+
+        mock_model = MagicMock()
+        mock_model.to.return_value = mock_model
+        mock_model_class.from_pretrained.side_effect = [mock_model, OSError("draft model unavailable")]
+
+        summariser = SummariserService()
+        summariser.load_assistant_model()
+
+        text = "The first sentence is the lead. The second sentence adds detail. " * 20
+        result = summariser.summarise(text, max_length=30, min_length=10, degrade=True)
+
+        assert result["metadata"]["degraded"] is True
+        assert result["metadata"]["model_used"] == "extractive"
+        assert result["summary"].startswith("The first sentence is the lead.")
+        assert len(result["summary"].split()) <= 22
+        mock_model.generate.assert_not_called()
+
+class FakeBackend(InferenceBackend):
+    name = "fake"
+
+    def __init__(self):
+        self.calls = []
+
+    def generate(self, input_ids, **generation_kwargs):
+        self.calls.append(generation_kwargs)
+        return [[0, 1, 2]]
+
+# Test an incomplete backend is rejected when it is created rather than mid-request
+def test_incomplete_backend_cannot_be_created():
+    class EncodeOnlyBackend(InferenceBackend):
+        def encode(self, input_ids):
+            return None
+
+    with pytest.raises(TypeError):
+        EncodeOnlyBackend()
+
+# Test an interrupted ONNX export leaves no directory behind for later starts to load
+def test_interrupted_onnx_export_is_not_left_in_place(tmp_path):
+    backend = OnnxRuntimeBackend.__new__(OnnxRuntimeBackend)
+    backend.model = MagicMock()
+
+    def partial_save(directory):
+        open(os.path.join(directory, "encoder_model.onnx"), "w").close()
+        raise KeyboardInterrupt()
+
+    backend.model.save_pretrained.side_effect = partial_save
+    export_dir = str(tmp_path / "onnx" / "facebook--bart-large-cnn")
+
+    with pytest.raises(KeyboardInterrupt):
+        backend.save_export(export_dir)
+    assert os.listdir(tmp_path / "onnx") == []
+
+    # A completed export is renamed into place
+    backend.model.save_pretrained.side_effect = lambda directory: open(os.path.join(directory, "encoder_model.onnx"), "w").close()
+    backend.save_export(export_dir)
+    assert os.listdir(export_dir) == ["encoder_model.onnx"]
+
+# Test ONNX failures other than a missing dependency fall back to torch with the same model
+def test_onnx_backend_failure_falls_back_to_torch(monkeypatch):
+    monkeypatch.setenv("INFERENCE_BACKEND", "onnx")
+    with patch('app.services.summariser.AutoTokenizer'), \
+         patch('app.services.summariser.AutoModelForSeq2SeqLM') as mock_model_class, \
+         patch('app.services.summariser.OnnxRuntimeBackend', side_effect=RuntimeError("export failed")):
+
+        summariser = SummariserService()
+
+        assert summariser.backend.name == "torch"
+        assert summariser.model_name == "facebook/bart-large-cnn"
+        mock_model_class.from_pretrained.assert_called_once()
+
+# Test an unrecognised backend setting is reported rather than silently ignored
+def test_unknown_backend_setting_warns(monkeypatch, caplog):
+    monkeypatch.setenv("INFERENCE_BACKEND", "onxx")
+    with patch('app.services.summariser.AutoTokenizer'), \
+         patch('app.services.summariser.AutoModelForSeq2SeqLM'):
+
+        summariser = SummariserService()
+
+    assert summariser.backend.name == "torch"
+    assert "Unknown INFERENCE_BACKEND 'onxx'" in caplog.text
+
+# Test a swapped-in backend is used instead of loading a model
+def test_summariser_with_fake_backend():
+    with patch('app.services.summariser.AutoTokenizer') as mock_tokenizer_class, \
+         patch('app.services.summariser.AutoModelForSeq2SeqLM') as mock_model_class:
+
+        mock_tokenizer = MagicMock()
+        mock_tokenizer.decode.return_value = "This is a test summary."
+        mock_tokenizer_class.from_pretrained.return_value = mock_tokenizer
+
+        backend = FakeBackend()
+        summariser = SummariserService(backend=backend)
+
+        text = "This is a test paragraph that should be summarized."
+        result = summariser.summarise(text, max_length=50, min_length=10, do_sample=False, use_assisted_generation=True)
+
+        assert result["summary"] == "This is a test summary."
+        assert result["metadata"]["inference_backend"] == "fake"
+        assert result["metadata"]["processing_device"] == "cpu"
+
+        # Assisted generation needs a torch model, so the backend generates directly
+        assert "assisted_generation" not in result["metadata"]
+        assert len(backend.calls) == 1
+        mock_model_class.from_pretrained.assert_not_called()
+
+# Test several lengths share one encoder pass and repeated texts hit the encoder cache
+def test_summariser_multiple_lengths_reuse_encoder_with_mock():
+    with patch('app.services.summariser.AutoTokenizer') as mock_tokenizer_class, \
+         patch('app.services.summariser.AutoModelForSeq2SeqLM') as mock_model_class:
+
+        mock_tokenizer = MagicMock()
+        mock_tokenizer.decode.side_effect = ["Short teaser.", "A longer abstract.", "Short teaser."]
+        mock_tokenizer_class.from_pretrained.return_value = mock_tokenizer
+
+        mock_model = MagicMock()
+        mock_model.generate.return_value = [[1, 2, 3, 4]]
+        mock_model.to.return_value = mock_model
+        mock_model_class.from_pretrained.return_value = mock_model
+        mock_encoder = mock_model.get_encoder.return_value
+
+        summariser = SummariserService()
+
+        text = "This is a test paragraph that should be summarized."
+        result = summariser.summarise(text, lengths=[(40, 10), (150, 60)], do_sample=False)
+
+        assert result["summary"] == "Short teaser."
+        assert [entry["summary"] for entry in result["summaries"]] == ["Short teaser.", "A longer abstract."]
+        assert [entry["max_length"] for entry in result["summaries"]] == [40, 150]
+        assert result["metadata"]["encoder_cache"] == {"hit": False, "reuses": 1}
+        assert mock_encoder.call_count == 1
+        assert mock_model.generate.call_count == 2
+        _, kwargs = mock_model.generate.call_args
+        assert "encoder_outputs" in kwargs
+
+        # Decode latency is tracked under the strategy that produced it
+        assert list(summariser.capacity.decode_seconds_per_token) == ["beam_search"]
+        assert summariser.predict_decoding_strategy(do_sample=True) == "sampling"
+
+        # The same text again only pays decoder cost
+        result = summariser.summarise(text, max_length=40, min_length=10, do_sample=False)
+        assert result["metadata"]["encoder_cache"] == {"hit": True, "reuses": 1}
+        assert "summaries" not in result
+        assert mock_encoder.call_count == 1
+
+        # A single requested length still gets the summaries list
+        mock_tokenizer.decode.side_effect = ["Short teaser."]
+        result = summariser.summarise(text, lengths=[(40, 10)], do_sample=False)
+        assert [entry["summary"] for entry in result["summaries"]] == ["Short teaser."]